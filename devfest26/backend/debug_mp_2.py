@@ -1,17 +1,25 @@
+"""
+Debug script: check whether mediapipe.solutions can be imported.
+Run directly; importing this module has no side effects.
+"""
 
-import sys
-import mediapipe
 
-print(f"mediapipe dir: {dir(mediapipe)}")
+def main():
+    import mediapipe
 
-try:
-    import mediapipe.solutions
-    print("Successfully imported mediapipe.solutions")
-except ImportError as e:
-    print(f"Failed to import mediapipe.solutions: {e}")
+    print(f"mediapipe dir: {dir(mediapipe)}")
 
-try:
-    from mediapipe import solutions
-    print("Successfully imported solutions from mediapipe")
-except ImportError as e:
-    print(f"Failed to import solutions from mediapipe: {e}")
+    try:
+        import mediapipe.solutions
+        print("Successfully imported mediapipe.solutions")
+    except ImportError as e:
+        print(f"Failed to import mediapipe.solutions: {e}")
+
+    try:
+        from mediapipe import solutions
+        print("Successfully imported solutions from mediapipe")
+    except ImportError as e:
+        print(f"Failed to import solutions from mediapipe: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,12 @@ from pynput.keyboard import Key, Controller
 import time
 import sys
 import ctypes
-import threading
+import logging
+
+log = logging.getLogger(__name__)
+
+# Movements MovementAnalyzer reports; only these can be bound to keys
+MOVEMENTS = ('jump', 'squat', 'moveLeft', 'moveRight')
 
 # Windows DirectInput Structures
 if sys.platform == 'win32':
@@ -59,21 +64,41 @@ if sys.platform == 'win32':
     # Extended keys need flag 0x0001 (KEYEVENTF_EXTENDEDKEY)
     EXTENDED_KEYS = {'ArrowUp', 'ArrowDown', 'ArrowLeft', 'ArrowRight'}
 
+    # Reusable input event: SendInput copies the struct, so one buffer can be
+    # mutated per call instead of allocating a fresh INPUT every keypress.
+    _KI_EVENT = INPUT(type=1, ki=KEYBDINPUT(wVk=0, wScan=0, dwFlags=0, time=0, dwExtraInfo=None))
+    _KI_SIZE = ctypes.sizeof(_KI_EVENT)
+    _KI_REF = ctypes.byref(_KI_EVENT)
+
     def PressKey(hexKeyCode, isExtended=False):
-        dwFlags = 0x0008 # KEYEVENTF_SCANCODE
-        if isExtended:
-            dwFlags |= 0x0001
-        
-        x = INPUT(type=1, ki=KEYBDINPUT(wVk=0, wScan=hexKeyCode, dwFlags=dwFlags, time=0, dwExtraInfo=None))
-        SendInput(1, ctypes.byref(x), ctypes.sizeof(x))
+        _KI_EVENT.ki.wScan = hexKeyCode
+        _KI_EVENT.ki.dwFlags = 0x0008 | (0x0001 if isExtended else 0) # KEYEVENTF_SCANCODE [| EXTENDEDKEY]
+        SendInput(1, _KI_REF, _KI_SIZE)
 
     def ReleaseKey(hexKeyCode, isExtended=False):
-        dwFlags = 0x0008 | 0x0002 # KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP
-        if isExtended:
-            dwFlags |= 0x0001
-            
-        x = INPUT(type=1, ki=KEYBDINPUT(wVk=0, wScan=hexKeyCode, dwFlags=dwFlags, time=0, dwExtraInfo=None))
-        SendInput(1, ctypes.byref(x), ctypes.sizeof(x))
+        _KI_EVENT.ki.wScan = hexKeyCode
+        _KI_EVENT.ki.dwFlags = 0x0008 | 0x0002 | (0x0001 if isExtended else 0) # KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP [| EXTENDEDKEY]
+        SendInput(1, _KI_REF, _KI_SIZE)
+
+    # Batch buffer so all transitions of one tick go out in a single SendInput call
+    _BATCH_LEN = 8
+    _BATCH = (INPUT * _BATCH_LEN)()
+    for _event in _BATCH:
+        _event.type = 1
+    _BATCH_PTR = ctypes.cast(_BATCH, LPINPUT)
+
+    def SendKeys(events):
+        """
+        Send several key events with one SendInput call per batch.
+        events: list of (hexKeyCode, isExtended, isKeyUp), sent in order.
+        """
+        for offset in range(0, len(events), _BATCH_LEN):
+            chunk = events[offset:offset + _BATCH_LEN]
+            for i, (hexKeyCode, isExtended, isKeyUp) in enumerate(chunk):
+                ki = _BATCH[i].ki
+                ki.wScan = hexKeyCode
+                ki.dwFlags = 0x0008 | (0x0002 if isKeyUp else 0) | (0x0001 if isExtended else 0)
+            SendInput(len(chunk), _BATCH_PTR, _KI_SIZE)
 
 class KeyboardController:
     def __init__(self):
@@ -102,143 +127,181 @@ class KeyboardController:
             'moveRight': 'ArrowRight'
         }
         
-        # Threading support
-        self.running = False
-        self.thread = None
-        self.lock = threading.Lock()
-        self.active_movements = set() # Movements currently triggered by pose
-        self.pressed_keys = set() # Keys currently physically pressed
+        # Movement -> platform key, resolved once per binding change:
+        # (scancode, is_extended) on Windows, a pynput key elsewhere.
+        self._resolved = self._resolve_bindings(self.bindings)
+        # Per-frame dispatch tables built from _resolved: ((movement, bit), ...) to pack
+        # the active movements into a mask, and mask -> frozenset of keys to hold.
+        self._movement_bits, self._mask_keys = self._build_dispatch(self._resolved)
+        # Written by the WebSocket thread, picked up by on_movement on the capture
+        # thread: a new (bindings, resolved, tables) tuple is published by one reference store.
+        self._bindings_pending = None
+        self._bindings_applied = None
+        
+        self.pressed_keys = set() # Resolved keys currently physically pressed
         
         # Minimum press duration
-        self.MIN_PRESS_DURATION = 0.1 # seconds
+        self.MIN_PRESS_NS = 100_000_000 # 0.1 s, integer nanoseconds on the monotonic clock
         self.key_start_times = {} # Track when each key was pressed
 
-    def start(self):
-        """Start the background input thread."""
-        if self.running: return
-        self.running = True
-        self.thread = threading.Thread(target=self._input_loop, daemon=True)
-        self.thread.start()
-        print("⌨️ Keyboard Controller Thread Started")
-
-    def stop(self):
-        """Stop the background input thread."""
-        self.running = False
-        if self.thread:
-            self.thread.join()
-        self.release_all()
-        print("⌨️ Keyboard Controller Thread Stopped")
+        # Steady-state short-circuit: skip on_movement when nothing can change
+        self._last_mask = None # Movement mask of the previous frame
+        self._next_release_time = float('inf') # When a min-duration hold next expires
 
     def set_bindings(self, bindings):
-        """Update movement-to-key bindings from frontend."""
-        with self.lock:
-            self.bindings = bindings
+        """Update movement-to-key bindings from frontend. Applied on the next frame."""
+        resolved = self._resolve_bindings(bindings)
+        self._bindings_pending = (dict(bindings), resolved, *self._build_dispatch(resolved))
         print(f"Updated key bindings: {bindings}")
         
     def on_movement(self, movements):
         """
-        Update active movements state. Non-blocking.
+        Press/release keys for the detected movements. Called once per frame
+        from the capture loop, so input is sent without a thread hand-off.
         movements: dict with boolean for each movement type
         """
-        with self.lock:
-            self.active_movements = {m for m, active in movements.items() if active}
-
-    def _input_loop(self):
-        """Background loop to handle key presses."""
-        while self.running:
-            try:
-                current_time = time.time()
-                
-                with self.lock:
-                    current_active = self.active_movements.copy()
-                    current_bindings = self.bindings.copy()
-
-                # Determine which keys SHOULD be pressed right now based on vision
-                vision_target_keys = set()
-                for movement in current_active:
-                    if movement in current_bindings:
-                        vision_target_keys.add(current_bindings[movement])
-
-                # Determine keys that MUST stay pressed due to minimum duration
-                min_duration_keys = set()
-                for key in self.pressed_keys:
-                    start_time = self.key_start_times.get(key, 0)
-                    if current_time - start_time < self.MIN_PRESS_DURATION:
-                        min_duration_keys.add(key)
-                
-                # Effective target includes vision targets AND keys that haven't been held long enough
-                effective_target_keys = vision_target_keys | min_duration_keys
-
-                # Identify keys to Press vs Release
-                keys_to_press = effective_target_keys - self.pressed_keys
-                keys_to_release = self.pressed_keys - effective_target_keys
-
-                # Execute Releases first
-                for key in keys_to_release:
-                    self._release_key_internal(key)
-                    self.pressed_keys.remove(key)
-                    if key in self.key_start_times:
-                        del self.key_start_times[key]
-
-                # Execute Presses
-                for key in keys_to_press:
-                    self._press_key_internal(key)
-                    self.pressed_keys.add(key)
-                    self.key_start_times[key] = current_time
-                
-                # Sleep briefly to avoid high CPU usage, but keep responsive
-                time.sleep(0.01)
-
-            except Exception as e:
-                print(f"Error in input loop: {e}")
-                time.sleep(0.1)
-
-    def _press_key_internal(self, key_str):
-        """Perform the actual platform-specific key press."""
+        try:
+            current_time = time.monotonic_ns()
+            
+            # Adopt bindings published by set_bindings (no lock on the hot path)
+            pending = self._bindings_pending
+            if pending is not self._bindings_applied:
+                self._bindings_applied = pending
+                self.bindings, self._resolved, self._movement_bits, self._mask_keys = pending
+                self._last_mask = None
+
+            # Pack the bound, active movements into a bitmask
+            mask = 0
+            for movement, bit in self._movement_bits:
+                if movements.get(movement):
+                    mask |= bit
+
+            # Nothing to do if vision agrees with last frame and no hold has expired
+            if mask == self._last_mask and current_time < self._next_release_time:
+                return
+
+            # Keys that SHOULD be pressed right now based on vision
+            vision_target_keys = self._mask_keys[mask]
+
+            # Determine keys that MUST stay pressed due to minimum duration
+            min_duration_keys = set()
+            for key in self.pressed_keys:
+                start_time = self.key_start_times.get(key, 0)
+                if current_time - start_time < self.MIN_PRESS_NS:
+                    min_duration_keys.add(key)
+            
+            # Effective target includes vision targets AND keys that haven't been held long enough
+            effective_target_keys = vision_target_keys | min_duration_keys
+
+            # Identify keys to Press vs Release
+            keys_to_press = effective_target_keys - self.pressed_keys
+            keys_to_release = self.pressed_keys - effective_target_keys
+
+            # Execute Releases first, then Presses
+            if keys_to_release or keys_to_press:
+                self._send_transitions(keys_to_release, keys_to_press)
+
+            for key in keys_to_release:
+                self.pressed_keys.remove(key)
+                if key in self.key_start_times:
+                    del self.key_start_times[key]
+
+            for key in keys_to_press:
+                self.pressed_keys.add(key)
+                self.key_start_times[key] = current_time
+
+            self._last_mask = mask
+
+            # Earliest time a key kept only by MIN_PRESS_NS may be released
+            self._next_release_time = min(
+                (t + self.MIN_PRESS_NS for t in self.key_start_times.values()
+                 if t + self.MIN_PRESS_NS > current_time),
+                default=float('inf'))
+
+        except Exception as e:
+            log.warning("Error sending input: %s", e)
+
+    def _resolve_bindings(self, bindings):
+        """Map each movement to its platform key, dropping keys we can't send."""
+        resolved = {}
+        for movement, key_str in bindings.items():
+            if movement not in MOVEMENTS:
+                # Bindings come from the frontend; unknown entries would also grow the dispatch table
+                log.warning("Unknown movement: %s", movement)
+                continue
+            if not isinstance(key_str, str) or not key_str:
+                # Unbound: the frontend sends null when a key is dragged to another movement
+                continue
+            key = self._resolve_key(key_str)
+            if key is None:
+                log.warning("Unknown key: %s", key_str)
+            else:
+                resolved[movement] = key
+        return resolved
+
+    def _build_dispatch(self, resolved):
+        """
+        Bit per bound movement, and the key set for every combination of those bits.
+        Only MOVEMENTS get bits, so the table never exceeds 2**len(MOVEMENTS) entries.
+        """
+        bound = [movement for movement in MOVEMENTS if movement in resolved]
+        movement_bits = tuple((movement, 1 << i) for i, movement in enumerate(bound))
+        mask_keys = tuple(
+            frozenset(resolved[movement] for movement, bit in movement_bits if mask & bit)
+            for mask in range(1 << len(movement_bits)))
+        return movement_bits, mask_keys
+
+    def _resolve_key(self, key_str):
+        """Resolve a frontend key name (e.g. 'ArrowUp', 'KeyW') to a platform key."""
         if self.is_windows:
             # Use DirectInput Scan Codes
             scancode = SCANCODE_MAP.get(key_str) or SCANCODE_MAP.get(key_str.replace('Key', ''))
-            is_extended = key_str in EXTENDED_KEYS
-            
-            if scancode:
-                PressKey(scancode, is_extended)
-                print(f"⌨️ [Win] Key DOWN: {key_str}")
-            else:
-                print(f"⚠️ [Win] Unknown key: {key_str}")
+            return (scancode, key_str in EXTENDED_KEYS) if scancode else None
+
+        # Standard Pynput
+        key = self.key_map.get(key_str)
+        if not key and len(key_str) == 1:
+            key = key_str.lower()
+        return key or None
+
+    def _send_transitions(self, keys_to_release, keys_to_press):
+        """Release then press the given resolved keys, batched into one SendInput on Windows."""
+        if not self.is_windows:
+            for key in keys_to_release:
+                self._release_key_internal(key)
+            for key in keys_to_press:
+                self._press_key_internal(key)
+            return
+
+        events = [(scancode, is_extended, True) for scancode, is_extended in keys_to_release]
+        events += [(scancode, is_extended, False) for scancode, is_extended in keys_to_press]
+        SendKeys(events)
+        log.debug("[Win] Keys UP: %s DOWN: %s", keys_to_release, keys_to_press)
+
+    def _press_key_internal(self, key):
+        """Perform the actual platform-specific key press of a resolved key."""
+        if self.is_windows:
+            PressKey(*key)
+            log.debug("[Win] Key DOWN: %s", key)
         else:
-            # Standard Pynput
-            key = self.key_map.get(key_str)
-            if not key and len(key_str) == 1:
-                key = key_str.lower()
-                
-            if key:
-                self.keyboard.press(key)
-                print(f"⌨️ Key DOWN: {key}")
-
-    def _release_key_internal(self, key_str):
-        """Perform the actual platform-specific key release."""
+            self.keyboard.press(key)
+            log.debug("Key DOWN: %s", key)
+
+    def _release_key_internal(self, key):
+        """Perform the actual platform-specific key release of a resolved key."""
         if self.is_windows:
-            scancode = SCANCODE_MAP.get(key_str) or SCANCODE_MAP.get(key_str.replace('Key', ''))
-            is_extended = key_str in EXTENDED_KEYS
-            
-            if scancode:
-                ReleaseKey(scancode, is_extended)
-                print(f"⌨️ [Win] Key UP: {key_str}")
+            ReleaseKey(*key)
+            log.debug("[Win] Key UP: %s", key)
         else:
-            key = self.key_map.get(key_str)
-            if not key and len(key_str) == 1:
-                key = key_str.lower()
-                
-            if key:
-                self.keyboard.release(key)
-                print(f"⌨️ Key UP: {key}")
+            self.keyboard.release(key)
+            log.debug("Key UP: %s", key)
     
     def release_all(self):
         """Release all held keys."""
-        with self.lock:
-            keys_to_release = list(self.pressed_keys)
-            
-        for key in keys_to_release:
+        for key in list(self.pressed_keys):
             self._release_key_internal(key)
         
         self.pressed_keys.clear()
+        self.key_start_times.clear()
+        self._last_mask = None
+        self._next_release_time = float('inf')
@@ -4,33 +4,48 @@ WebSocket server that captures webcam, detects poses, and simulates keyboard inp
 """
 
 import asyncio
-import json
 import cv2
+import orjson
+import numpy as np
 import websockets
 import threading
 import time
 import sys
-from pose_detector import PoseDetector
-from movement_analyzer import MovementAnalyzer
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pose_detector import PoseDetector, NUM_LANDMARKS, LEFT_HIP, RIGHT_HIP
+from movement_analyzer import MovementAnalyzer, TORSO
 from keyboard_controller import KeyboardController
 
+log = logging.getLogger(__name__)
+
 class ThreadedCamera:
     """
     Dedicated thread for grabbing frames from the camera.
     This prevents the main loop from getting stuck processing old buffered frames.
     """
+    # Without a driver buffer limit, a grab() faster than this returned a queued
+    # (stale) frame rather than waiting for the sensor.
+    QUEUED_GRAB_S = 0.005
+    MAX_DRAIN_GRABS = 4 # Decode at least every Nth grab even if grabs look queued
+
     def __init__(self, src=0):
         self.capture = cv2.VideoCapture(src)
         # Optimize camera settings immediately
         self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         self.capture.set(cv2.CAP_PROP_FPS, 60) # Target 60 FPS
-        # self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Specific to backend, might not work on all
+        # Keep at most one frame queued in the driver so update() never reads a stale image.
+        # Specific to backend; where unsupported, update() drains the queue itself.
+        self.buffer_limited = self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not self.buffer_limited:
+            print("⚠️ Camera backend ignores CAP_PROP_BUFFERSIZE, draining queued frames manually")
         
-        self.lock = threading.Lock()
-        self.frame = None
+        # Latest (ret, frame, frame_id), published with a single attribute store.
+        # One producer, readers only take whole tuples, so no lock is needed.
+        self.slot = (False, None, 0)
+        self.frame_ready = threading.Event() # Set whenever a new frame is published
         self.frame_id = 0 # Track frame freshness
-        self.ret = False
         self.running = False
         self.thread = None
 
@@ -42,31 +57,81 @@ class ThreadedCamera:
         return self
 
     def update(self):
+        drained = 0
         while self.running:
             if self.capture.isOpened():
-                ret, frame = self.capture.read()
-                with self.lock:
-                    self.ret = ret
-                    self.frame = frame
-                    if ret:
-                        self.frame_id += 1
+                if self.buffer_limited:
+                    ret, frame = self.capture.read()
+                else:
+                    # grab() without decoding until one actually waits for the camera,
+                    # then decode only that newest frame.
+                    grab_start = time.perf_counter()
+                    ret = self.capture.grab()
+                    if (ret and time.perf_counter() - grab_start < self.QUEUED_GRAB_S
+                            and drained < self.MAX_DRAIN_GRABS):
+                        drained += 1
+                        continue
+                    drained = 0
+                    ret, frame = self.capture.retrieve() if ret else (False, None)
+                if ret:
+                    self.frame_id += 1
+                self.slot = (ret, frame, self.frame_id)
+                if ret:
+                    self.frame_ready.set()
             else:
                 time.sleep(0.1)
 
     def read(self):
-        with self.lock:
-            return self.ret, self.frame, self.frame_id
+        return self.slot
+
+    def wait(self, timeout=None):
+        """Block until a frame newer than the last wait() is available."""
+        ready = self.frame_ready.wait(timeout)
+        self.frame_ready.clear()
+        return ready
 
     def stop(self):
         self.running = False
+        self.frame_ready.set()
         if self.thread:
             self.thread.join()
         self.capture.release()
 
 class XRciseBackend:
+    # Pose inference runs on a downscaled copy; landmarks are normalized so the
+    # full-resolution frame is still used for the preview.
+    DETECT_SIZE = (320, 240) # (width, height)
+    # Run pose inference on every Nth camera frame; in-between frames reuse the last result
+    DETECT_EVERY = 2
+    # While idle (calibrated, no movement active, torso still) drop to every Nth frame (~10 Hz at 30 FPS).
+    # Stillness is torso landmark displacement between the last two inferences, in normalized units.
+    DETECT_EVERY_IDLE = 3
+    IDLE_MOTION = 0.01
+    # Speculative jump: press early when the hips rise faster than this (normalized
+    # frame heights per second, negative = up) on consecutive inferences.
+    JUMP_PREDICT_VELOCITY = -0.5
+    JUMP_PREDICT_FRAMES = 2
+    # Preview window refresh cap; imshow/waitKey cost several ms, so don't pay it every frame
+    PREVIEW_INTERVAL_NS = 1_000_000_000 // 15 # ~15 FPS
+    # HighGUI must stay on the main thread on macOS; elsewhere the preview gets its own thread
+    RENDER_INLINE = sys.platform == 'darwin'
+    # Replies to frontend commands, serialized once (str so they go out as text frames)
+    ACKS = {
+        'config': orjson.dumps({'type': 'config_ack'}).decode(),
+        'start': orjson.dumps({'type': 'started'}).decode(),
+        'stop': orjson.dumps({'type': 'stopped'}).decode(),
+        'recalibrate': orjson.dumps({'type': 'recalibrating'}).decode(),
+    }
+    # Landmark history ring buffer: (inference, landmark, [x, y, visibility])
+    HISTORY_LEN = 64
+
     def __init__(self):
         self.pose_detector = PoseDetector()
         self.movement_analyzer = MovementAnalyzer()
+        # Calibration counts inferences, which run on every DETECT_EVERY-th frame;
+        # scale it so calibration still spans the same ~60 camera frames (~2 s)
+        self.movement_analyzer.calibration_frames = max(
+            1, self.movement_analyzer.calibration_frames // self.DETECT_EVERY)
         self.keyboard_controller = KeyboardController()
         
         self.running = False
@@ -74,6 +139,33 @@ class XRciseBackend:
         self.cap = None # Will hold ThreadedCamera instance
         self.websocket = None
         self.show_preview = True
+        # Detection runs one inference at a time on a worker thread: MediaPipe (C++,
+        # releases the GIL) works while the loop keeps handling frames and input.
+        # The loop polls for the result every frame and analyzes it as soon as it lands.
+        self._detect_pool = None
+        self._pending = None # Future for the in-flight detection
+        self._detect_buf = None # Mirrored downscale handed to the worker (free while nothing is in flight)
+        self._resize_buf = None # Unmirrored downscale, flipped into the detect buffer
+        self._frame_idx = 0
+        self._last_submit_idx = None # _frame_idx of the last submitted frame
+        # Set from the preview/WebSocket threads; the capture loop does the reset so it
+        # never lands between analyze()'s is_calibrating check and its calibrated_pose reads
+        self._recalibrate_requested = False
+        self._last_detection = None # (detection_result, movements) from the last inference
+        self._idle = False # Last inference saw a still, untriggered user; detect less often
+        # Preallocated so recording a pose is one array write, and velocities are array math
+        self._lm_hist = np.zeros((self.HISTORY_LEN, NUM_LANDMARKS, 3), dtype=np.float32)
+        self._lm_times = np.zeros(self.HISTORY_LEN, dtype=np.float64)
+        self._lm_idx = 0 # Next slot to write
+        self._lm_run = 0 # Consecutive inferences with a pose (history is contiguous over these)
+        self._last_preview_ns = 0
+        self._last_thumb = None # 8x8 downsample of the last frame sent to detection
+        self._preview_buf = None # Reused mirrored canvas for the preview window
+        # Latest-wins mailbox from the capture loop to the render thread
+        self._render_slot = None # (frame, detection_result, fps)
+        self._render_ready = threading.Event()
+        self._render_thread = None
+        self._fps_overlay = (None, None) # (fps, boolean text mask), re-rasterized only when fps changes
         
     async def handle_client(self, websocket):
         """Handle WebSocket connection from frontend."""
@@ -82,7 +174,7 @@ class XRciseBackend:
         
         try:
             async for message in websocket:
-                data = json.loads(message)
+                data = orjson.loads(message)
                 # print(f"📩 Received: {data}") # Reduce verbosity
                 
                 if data['type'] == 'config':
@@ -94,20 +186,20 @@ class XRciseBackend:
                     if 'sensitivity' in data and data['sensitivity']:
                         self.movement_analyzer.update_config(data['sensitivity'])
                         
-                    await websocket.send(json.dumps({'type': 'config_ack'}))
+                    await websocket.send(self.ACKS['config'])
                     
                 elif data['type'] == 'start':
                     # Camera is already running in main thread, just acknowledge
                     # We could add logic to pause/resume detection processing if needed
-                    await websocket.send(json.dumps({'type': 'started'}))
+                    await websocket.send(self.ACKS['start'])
                     
                 elif data['type'] == 'stop':
                     # Don't actually stop the camera loop, just acknowledge
-                    await websocket.send(json.dumps({'type': 'stopped'}))
+                    await websocket.send(self.ACKS['stop'])
                     
                 elif data['type'] == 'recalibrate':
-                    self.movement_analyzer.reset_calibration()
-                    await websocket.send(json.dumps({'type': 'recalibrating'}))
+                    self._recalibrate_requested = True
+                    await websocket.send(self.ACKS['recalibrate'])
                     
         except websockets.exceptions.ConnectionClosed:
             print("🔌 Frontend disconnected")
@@ -123,7 +215,13 @@ class XRciseBackend:
         # Initialize Threaded Camera
         try:
             self.cap = ThreadedCamera(0).start()
-            self.keyboard_controller.start()
+            w, h = self.DETECT_SIZE
+            self._detect_buf = np.empty((h, w, 3), dtype=np.uint8)
+            self._resize_buf = np.empty((h, w, 3), dtype=np.uint8)
+            self._detect_pool = ThreadPoolExecutor(max_workers=1)
+            if self.show_preview and not self.RENDER_INLINE:
+                self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
+                self._render_thread.start()
             print("🎥 Threaded Camera initialized!")
             print("📍 Stand in view of camera and stay still for calibration...")
         except Exception as e:
@@ -138,10 +236,113 @@ class XRciseBackend:
             self.cap.stop()
             self.cap = None
         
-        cv2.destroyAllWindows()
-        self.keyboard_controller.stop()
+        if self._detect_pool:
+            self._detect_pool.shutdown(wait=True)
+            self._detect_pool = None
+            self._pending = None
+            self._last_submit_idx = None
+        
+        if self._render_thread:
+            # The render thread closes its own window on exit
+            self._render_ready.set()
+            if self._render_thread is not threading.current_thread():
+                self._render_thread.join()
+            self._render_thread = None
+        else:
+            cv2.destroyAllWindows()
+        self.keyboard_controller.release_all()
         print("🛑 Motion detection stopped")
     
+    def _is_repeat_frame(self, frame):
+        """
+        True if frame matches the last detected one at 8x8. Sensor noise makes
+        real frames differ, so this only catches a driver re-delivering a buffer.
+        """
+        thumb = cv2.resize(frame, (8, 8), interpolation=cv2.INTER_AREA)
+        if self._last_thumb is not None and np.array_equal(thumb, self._last_thumb):
+            return True
+        self._last_thumb = thumb
+        return False
+
+    def _submit_detection(self, frame):
+        """Start pose detection on a mirrored, downscaled copy of frame. Only call with nothing in flight."""
+        cv2.resize(frame, self.DETECT_SIZE, dst=self._resize_buf, interpolation=cv2.INTER_AREA)
+        # Mirror after downscaling: flipping the small image is a quarter of the work
+        cv2.flip(self._resize_buf, 1, dst=self._detect_buf)
+        self._pending = self._detect_pool.submit(self.pose_detector.detect, self._detect_buf)
+        # Wake the capture loop as soon as the result is ready instead of on the next frame
+        frame_ready = self.cap.frame_ready
+        self._pending.add_done_callback(lambda _: frame_ready.set())
+        self._last_submit_idx = self._frame_idx
+
+    def _collect_detection(self):
+        """Analyze the in-flight detection if it has finished; never blocks. True if it did."""
+        pending = self._pending
+        if pending is None or not pending.done():
+            return False
+        self._pending = None
+        
+        landmarks, detection_result = pending.result()
+        self._record_landmarks(landmarks)
+        
+        # Analyze movements
+        movements = self.movement_analyzer.analyze(landmarks)
+        movements = self._predict_jump(landmarks, movements)
+        self._last_detection = (detection_result, movements)
+        self._idle = self._is_idle(movements)
+        return True
+
+    def _is_idle(self, movements):
+        """True if calibrated, nothing is triggered and the torso barely moved since the last inference."""
+        if self.movement_analyzer.is_calibrating or self._lm_run < 2 or any(movements.values()):
+            return False
+        idx = self._recent_history(2)
+        torso = self._lm_hist[idx][:, TORSO, :2]
+        return np.abs(torso[1] - torso[0]).max() < self.IDLE_MOTION
+
+    def _record_landmarks(self, landmarks):
+        """Write the full pose into the next history slot (or mark a gap)."""
+        if landmarks is None:
+            self._lm_run = 0
+            return
+        
+        slot = self._lm_idx % self.HISTORY_LEN
+        self._lm_hist[slot] = landmarks
+        self._lm_times[slot] = time.monotonic()
+        self._lm_idx += 1
+        self._lm_run += 1
+
+    def _recent_history(self, count):
+        """Slot indices of the last count recorded poses, oldest first."""
+        return (self._lm_idx - count + np.arange(count)) % self.HISTORY_LEN
+
+    def _predict_jump(self, landmarks, movements):
+        """
+        Fire 'jump' one inference early when the hips are already rising fast.
+        A mispredict only costs a minimum-duration tap: the key is released
+        as soon as the analyzer stops reporting a jump.
+        """
+        analyzer = self.movement_analyzer
+        samples = self.JUMP_PREDICT_FRAMES + 1
+        if (landmarks is None or analyzer.is_calibrating or movements['jump']
+                or self._lm_run < samples):
+            return movements
+
+        # Only above the calibrated standing hip line, so rising out of a squat isn't a jump
+        hip_y = (landmarks[LEFT_HIP, 1] + landmarks[RIGHT_HIP, 1]) / 2
+        if hip_y > analyzer.calibrated_pose['rect'][3]:
+            return movements
+
+        idx = self._recent_history(samples)
+        hips_y = self._lm_hist[idx, LEFT_HIP:RIGHT_HIP + 1, 1].mean(axis=1)
+        dt = np.diff(self._lm_times[idx])
+        if np.any(dt <= 0) or np.any(np.diff(hips_y) / dt > self.JUMP_PREDICT_VELOCITY):
+            return movements
+
+        movements = dict(movements)
+        movements['jump'] = True
+        return movements
+
     def run_capture_loop(self):
         """Main capture and detection loop. MUST RUN ON MAIN THREAD."""
         if not self.running or not self.cap:
@@ -150,81 +351,156 @@ class XRciseBackend:
         try:
             print("🎥 Starting capture loop...")
             frame_count = 0
-            start_time = time.time()
+            fps = 0 # Last full-second measurement, shown in the preview
+            start_ns = time.perf_counter_ns()
             last_frame_id = -1
             
             while self.running:
+                if self._recalibrate_requested:
+                    self._recalibrate_requested = False
+                    self.movement_analyzer.reset_calibration()
+                    self._idle = False
+                
+                # Sleep until the camera thread publishes a new frame (latest-wins slot)
+                # or the in-flight detection finishes (its done callback sets the same event)
+                self.cap.wait(timeout=0.1)
+                
+                # Use a finished detection right away, before waiting for another frame
+                if self._collect_detection():
+                    self.keyboard_controller.on_movement(self._last_detection[1])
+                
                 ret, frame, frame_id = self.cap.read()
                 
                 if not ret or frame is None:
                     # Thread might be starting up
-                    time.sleep(0.01)
                     continue
                 
-                # Skip duplicate frames
+                # Skip duplicate frames (a wake from a finished detection, input already sent above)
                 if frame_id == last_frame_id:
-                    time.sleep(0.001) # Ultra short sleep to yield
                     continue
                 last_frame_id = frame_id
                 
-                # Flip frame horizontally for mirror effect
-                frame = cv2.flip(frame, 1)
+                # Frame stays unmirrored here; detection and preview each mirror their own copy
+                
+                # Start the next detection once the last one is in, so one stays in flight
+                detect_every = self.DETECT_EVERY_IDLE if self._idle else self.DETECT_EVERY
+                if (self._pending is None
+                        and (self._last_submit_idx is None
+                             or self._frame_idx - self._last_submit_idx >= detect_every)
+                        and not self._is_repeat_frame(frame)):
+                    self._submit_detection(frame)
+                self._frame_idx += 1
                 
-                # Detect pose (returns tuple now)
-                landmarks, detection_result = self.pose_detector.detect(frame)
+                if self._last_detection is None:
+                    # First detection still running
+                    continue
                 
-                # Analyze movements
-                movements = self.movement_analyzer.analyze(landmarks)
+                # Between inferences the body barely moves in one frame period, so reuse the last pose.
+                # Not re-analyzed, so calibration still counts real inferences only.
+                detection_result, movements = self._last_detection
                 
                 # Trigger keyboard input
                 self.keyboard_controller.on_movement(movements)
                 
-                # Show preview window
-                if self.show_preview:
-                    # Pass the raw detection result to avoid re-running inference!
-                    preview = self.pose_detector.draw_landmarks(frame.copy(), detection_result)
-                    
-                    # Draw Bounding Box Feedback (Safe Zone, Labels, Calibration)
-                    preview = self.movement_analyzer.draw_feedback(preview)
-                    
-                    # FPS Counter
-                    frame_count += 1
-                    elapsed = time.time() - start_time
-                    if elapsed > 1.0:
-                        fps = frame_count / elapsed
-                        frame_count = 0
-                        start_time = time.time()
-                        print(f"⚡ FPS: {fps:.1f}") # Log FPS to verify performance
-                        
-                    cv2.putText(preview, f"FPS: {int(frame_count / max(elapsed, 0.001))}", (10, 30), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    
-                    cv2.imshow('XRcise Preview', preview)
+                # FPS Counter (counts processed frames, not preview refreshes)
+                frame_count += 1
+                now_ns = time.perf_counter_ns()
+                elapsed_ns = now_ns - start_ns
+                if elapsed_ns > 1_000_000_000:
+                    fps = frame_count * 1_000_000_000 // elapsed_ns
+                    frame_count = 0
+                    start_ns = now_ns
+                    log.debug("⚡ FPS: %d", fps) # Enable DEBUG logging to verify performance
+                
+                # Show preview window (rate limited)
+                if self.show_preview and now_ns - self._last_preview_ns >= self.PREVIEW_INTERVAL_NS:
+                    self._last_preview_ns = now_ns
                     
-                    # Handle key press for preview window
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        self.running = False
-                    elif key == ord('r'):
-                        self.movement_analyzer.reset_calibration()
+                    # Camera frames are never written after read(), so handing one over is safe
+                    if self.RENDER_INLINE:
+                        self._render_preview(frame, detection_result, fps)
+                    else:
+                        self._render_slot = (frame, detection_result, fps)
+                        self._render_ready.set()
         finally:
             self.stop_detection()
 
 
+    def _render_loop(self):
+        """Preview thread: draw whatever the capture loop published last."""
+        try:
+            while self.running:
+                self._render_ready.wait(timeout=0.1)
+                self._render_ready.clear()
+                slot, self._render_slot = self._render_slot, None
+                if slot is not None:
+                    self._render_preview(*slot)
+        finally:
+            cv2.destroyAllWindows()
+
+    def _render_preview(self, frame, detection_result, fps):
+        """Draw landmarks, feedback and FPS onto a mirrored copy of frame and show it."""
+        # Pass the raw detection result to avoid re-running inference!
+        # Mirror into the reused canvas: one copy, no per-frame allocation
+        if self._preview_buf is None or self._preview_buf.shape != frame.shape:
+            self._preview_buf = np.empty_like(frame)
+        preview = self.pose_detector.draw_landmarks(frame[:, ::-1], detection_result, out=self._preview_buf)
+        
+        # Draw Bounding Box Feedback (Safe Zone, Labels, Calibration)
+        preview = self.movement_analyzer.draw_feedback(preview)
+        
+        # FPS label: stamp a cached text mask instead of rasterizing the string every refresh
+        cached_fps, mask = self._fps_overlay
+        if cached_fps != fps:
+            canvas = np.zeros((40, 160), dtype=np.uint8)
+            cv2.putText(canvas, f"FPS: {fps}", (10, 30), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2)
+            mask = canvas.astype(bool)
+            self._fps_overlay = (fps, mask)
+        preview[:40, :160][mask] = (0, 255, 0)
+        
+        cv2.imshow('XRcise Preview', preview)
+        
+        # Handle key press for preview window
+        key = cv2.pollKey() & 0xFF # Pumps GUI events without the 1 ms sleep of waitKey(1)
+        if key == ord('q'):
+            self.running = False
+        elif key == ord('r'):
+            self._recalibrate_requested = True
+
+
 def run_server(backend):
     """Run WebSocket server in a separate thread."""
-    loop = asyncio.new_event_loop()
+    loop = None
+    if sys.platform != 'win32':
+        # uvloop is POSIX-only and optional; fall back to the stock loop without it
+        try:
+            import uvloop
+            loop = uvloop.new_event_loop()
+        except ImportError:
+            pass
+    if loop is None:
+        loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     
     async def server_task():
         print("Waiting for frontend connection on ws://localhost:8765")
-        async with websockets.serve(backend.handle_client, "localhost", 8765):
+        # Control messages are tiny localhost JSON: skip deflate, cap frame size, no keepalive pings
+        async with websockets.serve(backend.handle_client, "localhost", 8765,
+                                    compression=None, max_size=2**14, ping_interval=None):
             await asyncio.Future()  # Run forever
             
     loop.run_until_complete(server_task())
 
 def main():
     """Main entry point."""
+    # Analyzer status goes through logging: show INFO from this app's modules only.
+    # The root stays at WARNING so library chatter (e.g. websockets) stays quiet,
+    # and per-frame DEBUG stays off.
+    logging.basicConfig(format='%(message)s')
+    for name in (__name__, 'movement_analyzer', 'keyboard_controller'):
+        logging.getLogger(name).setLevel(logging.INFO)
+    
     print("=" * 50)
     print("🎮 XRcise Backend Server")
     print("=" * 50)
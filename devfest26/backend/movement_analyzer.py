@@ -1,12 +1,21 @@
 import numpy as np
 import cv2
 import time
-from collections import deque
+import logging
+from pose_detector import NOSE, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP
+
+# Landmarks that define the torso box
+TORSO = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP]
+
+log = logging.getLogger(__name__)
 
 class MovementAnalyzer:
     def __init__(self):
         # Calibration state
-        self.calibration_boxes = []  # List of [min_x, min_y, max_x, max_y]
+        # Running sum of torso boxes [min_x, min_y, max_x, max_y] seen while calibrating
+        self.calibration_box_sum = np.zeros(4, dtype=np.float64)
+        self.calibration_count = 0
+        self.last_calibration_box = None
         self.calibrated_pose = None  # {shoulder_y, hip_y, center_x, torso_h, torso_w}
         
         # Configuration (Default)
@@ -17,6 +26,7 @@ class MovementAnalyzer:
         
         self.repeat_delay = 1.0       # Seconds to hold before repeating
         self.repeat_interval = 0.2    # Seconds between repeats
+        self.idle_epsilon = 0.003     # Keypoint motion (normalized) below which an idle frame isn't re-checked
         
         # State
         self.frame_count = 0
@@ -24,6 +34,10 @@ class MovementAnalyzer:
             'jump': 0, 'squat': 0, 'moveLeft': 0, 'moveRight': 0
         }
         self.last_movements = {}
+        # Reused result dict, reset in place each frame (callers read it before the next analyze)
+        self._movements = {'jump': False, 'squat': False, 'moveLeft': False, 'moveRight': False}
+        # (shoulder_x, shoulder_y, nose_y) of the last fully checked frame, for the idle short-circuit
+        self._idle_ref = None
         self.is_calibrating = True
         self.calibration_message = "Step back to see full body"
 
@@ -34,28 +48,30 @@ class MovementAnalyzer:
         if 'sideSensitivity' in config: self.side_sensitivity = config['sideSensitivity']
         if 'repeatDelay' in config: self.repeat_delay = config['repeatDelay']
         if 'repeatInterval' in config: self.repeat_interval = config['repeatInterval']
-        print(f"🔧 Config Updated: {config}")
+        log.info("🔧 Config Updated: %s", config)
 
     def is_user_in_frame(self, landmarks):
         """Check if all required keypoints are visible."""
-        required = [
-            landmarks['left_shoulder'], landmarks['right_shoulder'],
-            landmarks['left_hip'], landmarks['right_hip']
-        ]
         # Check visibility (if score available, but lite model might just give coords)
         # Simply check if they are within [0,1] bounds reasonably
-        for p in required:
-            if not (0.05 < p['x'] < 0.95 and 0.05 < p['y'] < 0.95):
+        for i in TORSO:
+            x, y = landmarks[i, 0], landmarks[i, 1]
+            if not (0.05 < x < 0.95 and 0.05 < y < 0.95):
                 return False
         return True
 
     def analyze(self, landmarks):
+        """
+        landmarks: (NUM_LANDMARKS, 3) array from PoseDetector.detect, or None.
+        Returns dict with boolean for each movement type. The same dict is
+        reused on every call, so copy it to keep a frame's result.
+        """
         self.frame_count += 1
-        current_movements = {
-            'jump': False, 'squat': False, 'moveLeft': False, 'moveRight': False
-        }
+        current_movements = self._movements
+        for movement in current_movements:
+            current_movements[movement] = False
         
-        if not landmarks:
+        if landmarks is None:
             # Reset timers if tracking lost? Or keep them?
             # Better to reset to prevent stuck keys
             self.reset_timers()
@@ -71,44 +87,52 @@ class MovementAnalyzer:
                 self.calibration_message = "❌ Step back! Show full body."
                 return current_movements
             
-            self.calibration_message = f"CALIBRATING... {self.calibration_frames - len(self.calibration_boxes)}"
+            self.calibration_message = f"CALIBRATING... {self.calibration_frames - self.calibration_count}"
             
             # Collect Torso Box
-            torso_points = [
-                landmarks['left_shoulder'], landmarks['right_shoulder'],
-                landmarks['left_hip'], landmarks['right_hip']
-            ]
-            xs = [p['x'] for p in torso_points]
-            ys = [p['y'] for p in torso_points]
-            curr_box = [min(xs), min(ys), max(xs), max(ys)]
-            self.calibration_boxes.append(curr_box)
+            torso = landmarks[TORSO, :2]
+            curr_box = np.concatenate((torso.min(axis=0), torso.max(axis=0)))
+            self.calibration_box_sum += curr_box
+            self.calibration_count += 1
+            self.last_calibration_box = curr_box
             
-            if len(self.calibration_boxes) >= self.calibration_frames:
+            if self.calibration_count >= self.calibration_frames:
                 self._finalize_calibration()
                 
             return current_movements
 
         # 3. Detection Phase
+        cp = self.calibrated_pose
         
         # Calculate Current Keypoints
-        l_shoulder = landmarks['left_shoulder']
-        r_shoulder = landmarks['right_shoulder']
-        nose = landmarks['nose']
+        # Python floats from here on: scalar math on NumPy scalars is slower
+        avg_shoulder_x, avg_shoulder_y = ((landmarks[LEFT_SHOULDER, :2] + landmarks[RIGHT_SHOULDER, :2]) / 2).tolist()
+        nose_y = float(landmarks[NOSE, 1])
         
-        avg_shoulder_y = (l_shoulder['y'] + r_shoulder['y']) / 2
-        avg_shoulder_x = (l_shoulder['x'] + r_shoulder['x']) / 2
+        # Idle: nothing was triggered and the keypoints stayed within epsilon of the
+        # last checked frame, so no line can have been crossed. Comparing against that
+        # frame (not the previous one) keeps slow drift from adding up unchecked.
+        ref = self._idle_ref
+        eps = self.idle_epsilon
+        if (ref is not None and not any(self.state_timers.values())
+                and abs(avg_shoulder_x - ref[0]) < eps
+                and abs(avg_shoulder_y - ref[1]) < eps
+                and abs(nose_y - ref[2]) < eps):
+            self.last_movements = current_movements
+            return current_movements
+        self._idle_ref = (avg_shoulder_x, avg_shoulder_y, nose_y)
+        
+        now = time.time() # One timestamp for every trigger this frame
         
         # JUMP: Nose crosses Jump Line (Above)
-        jump_line = self.calibrated_pose['jump_line']
-        if nose['y'] < jump_line:
-            self._handle_trigger('jump', current_movements)
+        if nose_y < cp['jump_line']:
+            self._handle_trigger('jump', current_movements, now)
         else:
             self.state_timers['jump'] = 0
 
         # SQUAT: Shoulders cross Squat Line (Below)
-        squat_line = self.calibrated_pose['squat_line']
-        if avg_shoulder_y > squat_line:
-            self._handle_trigger('squat', current_movements)
+        if avg_shoulder_y > cp['squat_line']:
+            self._handle_trigger('squat', current_movements, now)
         else:
             self.state_timers['squat'] = 0
             
@@ -122,11 +146,7 @@ class MovementAnalyzer:
         
         # Calculate Lines relative to Torso Size
         # We need to maintain the "Safe Zone" width, but shift the Center.
-        cp = self.calibrated_pose
         safe_width = cp['right_line'] - cp['left_line']
-        half_width = safe_width / 2
-
-        current_center = (cp['left_line'] + cp['right_line']) / 2
         
         # Check Triggers with Instant Reset (Ratchet)
         # If we move Left, we pull the Right Boundary with us.
@@ -135,7 +155,7 @@ class MovementAnalyzer:
         # Bias: If we are actively moving/holding a direction, the center shifts towards us.
         
         if avg_shoulder_x < cp['left_line']:
-            self._handle_trigger('moveLeft', current_movements)
+            self._handle_trigger('moveLeft', current_movements, now)
             
             # AGGRESSIVE RATCHET
             # We are holding Left. We want to trigger Right immediately if we move back.
@@ -155,7 +175,7 @@ class MovementAnalyzer:
             cp['left_line'] = target_right_line - safe_width # Maintain width for consistency
             
         elif avg_shoulder_x > cp['right_line']:
-            self._handle_trigger('moveRight', current_movements)
+            self._handle_trigger('moveRight', current_movements, now)
             
             # AGGRESSIVE RATCHET
             # We are holding Right. Pull Left Line close.
@@ -173,14 +193,13 @@ class MovementAnalyzer:
         self.last_movements = current_movements
         return current_movements
 
-    def _handle_trigger(self, action, movements):
-        """Handle repeat logic."""
-        now = time.time()
+    def _handle_trigger(self, action, movements, now):
+        """Handle repeat logic. now: time.time() of the frame being analyzed."""
         if self.state_timers[action] == 0:
             # First trigger
             movements[action] = True
             self.state_timers[action] = now
-            print(f"🎬 {action.upper()} Start")
+            log.debug("🎬 %s Start", action)
         else:
             # Holding
             duration = now - self.state_timers[action]
@@ -204,7 +223,7 @@ class MovementAnalyzer:
                 movements[action] = True
 
     def _finalize_calibration(self):
-        avg_box = np.mean(self.calibration_boxes, axis=0) # [x1, y1, x2, y2]
+        avg_box = self.calibration_box_sum / self.calibration_count # [x1, y1, x2, y2]
         w = avg_box[2] - avg_box[0]
         h = avg_box[3] - avg_box[1]
         
@@ -228,18 +247,21 @@ class MovementAnalyzer:
             'rect': avg_box
         }
         self.is_calibrating = False
-        print(f"✅ Calibrated: {self.calibrated_pose}")
+        log.info("✅ Calibrated: %s", self.calibrated_pose)
 
     def reset_timers(self):
         for k in self.state_timers: self.state_timers[k] = 0
 
     def reset_calibration(self):
         self.frame_count = 0
-        self.calibration_boxes = []
+        self.calibration_box_sum = np.zeros(4, dtype=np.float64)
+        self.calibration_count = 0
+        self.last_calibration_box = None
         self.calibrated_pose = None
+        self._idle_ref = None
         self.is_calibrating = True
         self.calibration_message = "Step back to see full body"
-        print("🔄 Calibration Reset")
+        log.info("🔄 Calibration Reset")
 
     def draw_feedback(self, frame):
         h, w, _ = frame.shape
@@ -250,8 +272,8 @@ class MovementAnalyzer:
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
             
             # Show current box if tracking
-            if len(self.calibration_boxes) > 0:
-                last_box = self.calibration_boxes[-1]
+            if self.last_calibration_box is not None:
+                last_box = self.last_calibration_box
                 p1 = (int(last_box[0] * w), int(last_box[1] * h))
                 p2 = (int(last_box[2] * w), int(last_box[3] * h))
                 cv2.rectangle(frame, p1, p2, (0, 255, 0), 1)
@@ -5,20 +5,48 @@ Extracts key landmarks for movement detection.
 
 import mediapipe as mp
 import cv2
+import time
 import numpy as np
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
+# Row indices into the landmark array returned by PoseDetector.detect().
+# Based on: https://developers.google.com/mediapipe/solutions/vision/pose_landmarker
+NUM_LANDMARKS = 33
+NOSE = 0
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+
+# Default for draw_landmarks' detection_result: draw whatever detect() produced last
+_LAST_RESULT = object()
+
 class PoseDetector:
     def __init__(self):
         # Create an PoseLandmarker object.
         import os
         model_path = os.path.join(os.path.dirname(__file__), 'pose_landmarker_lite.task')
-        base_options = python.BaseOptions(model_asset_path=model_path)
-        options = vision.PoseLandmarkerOptions(
-            base_options=base_options,
-            output_segmentation_masks=False)
-        self.detector = vision.PoseLandmarker.create_from_options(options)
+        self._last_timestamp_ms = -1
+        # Prefer the GPU delegate (OpenGL on Linux, Metal on macOS); fall back to CPU where
+        # it isn't available, e.g. on Windows or without a physical GPU. Run one warm-up
+        # inference before accepting it: some GPU setups only fail on the first detect.
+        detector = None
+        try:
+            detector = self._create_detector(model_path, python.BaseOptions.Delegate.GPU)
+            warmup = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.zeros((240, 320, 3), dtype=np.uint8))
+            detector.detect_for_video(warmup, self._next_timestamp_ms())
+            self.detector = detector
+            print("⚡ Pose detection running on GPU")
+        except Exception as e:
+            print(f"⚠️ GPU delegate unavailable ({e}), using CPU")
+            if detector is not None:
+                try:
+                    detector.close()
+                except Exception:
+                    pass # Already broken; don't let cleanup block the CPU fallback
+            self.detector = self._create_detector(model_path, python.BaseOptions.Delegate.CPU)
+        self._last_result = None # Raw result of the last detect(), reused by draw_landmarks
         
         # Define connection pairs for consistent drawing
         # These correspond to standard MediaPipe Pose topology
@@ -31,62 +59,80 @@ class PoseDetector:
             (24, 26), (25, 27), (26, 28), (27, 29), (28, 30),
             (29, 31), (30, 32), (27, 31), (28, 32)
         ]
+        self._connections = np.array(self.POSE_CONNECTIONS, dtype=np.int32) # (M, 2) endpoint indices
+        
+        # RGB conversion target, reused across detect() calls (resized on shape change)
+        self._rgb = None
+
+    def _create_detector(self, model_path, delegate):
+        """Create the PoseLandmarker on the given delegate."""
+        base_options = python.BaseOptions(model_asset_path=model_path, delegate=delegate)
+        # VIDEO mode tracks the pose between calls and only re-runs the person
+        # detector when tracking is lost. It needs strictly increasing timestamps.
+        # Fast preset: one player, and loose thresholds so a coarse torso position
+        # keeps tracking instead of falling back to full detection.
+        options = vision.PoseLandmarkerOptions(
+            base_options=base_options,
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=1,
+            min_pose_detection_confidence=0.3,
+            min_tracking_confidence=0.3,
+            output_segmentation_masks=False)
+        return vision.PoseLandmarker.create_from_options(options)
 
     def detect(self, frame):
         """
         Detect pose in frame and return landmarks.
         Returns:
-            landmarks: dict with normalized landmark positions.
-            detection_result: Raw MediaPipe detection result (for drawing).
+            landmarks: (NUM_LANDMARKS, 3) float32 array of normalized (x, y, visibility),
+                indexed by the landmark constants above, or None if no pose was found.
+            detection_result: Raw MediaPipe detection result (for drawing), returned
+                even without a pose so the preview draws nothing for this frame.
         """
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+        # Convert BGR to RGB into the reused buffer. detect() is synchronous,
+        # so the buffer is free again once it returns.
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=self._rgb)
         
-        detection_result = self.detector.detect(mp_image)
+        detection_result = self.detector.detect_for_video(mp_image, self._next_timestamp_ms())
+        self._last_result = detection_result
         
         if not detection_result.pose_landmarks:
-            return None, None
+            return None, detection_result
             
-        # Get the first detected pose
+        # Get the first detected pose as one (x, y, visibility) row per landmark.
+        # A fresh array per call: results are consumed on another thread.
         landmarks = detection_result.pose_landmarks[0]
-        
-        # Extract key landmarks for movement detection
-        # Indices based on: https://developers.google.com/mediapipe/solutions/vision/pose_landmarker
-        processed_landmarks = {
-            'nose': self._get_point(landmarks[0]),
-            'left_shoulder': self._get_point(landmarks[11]),
-            'right_shoulder': self._get_point(landmarks[12]),
-            'left_hip': self._get_point(landmarks[23]),
-            'right_hip': self._get_point(landmarks[24]),
-            'left_knee': self._get_point(landmarks[25]),
-            'right_knee': self._get_point(landmarks[26]),
-            'left_ankle': self._get_point(landmarks[27]),
-            'right_ankle': self._get_point(landmarks[28]),
-        }
+        processed_landmarks = np.array(
+            [(lm.x, lm.y, lm.visibility) for lm in landmarks], dtype=np.float32)
         
         return processed_landmarks, detection_result
     
-    def _get_point(self, landmark):
-        """Extract x, y, visibility from landmark."""
-        return {
-            'x': landmark.x,
-            'y': landmark.y,
-            'visibility': landmark.visibility
-        }
+    def _next_timestamp_ms(self):
+        """Monotonic timestamp for detect_for_video, bumped if two calls land in the same ms."""
+        timestamp_ms = max(int(time.monotonic() * 1000), self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        return timestamp_ms
     
-    def draw_landmarks(self, frame, detection_result=None):
+    def draw_landmarks(self, frame, detection_result=_LAST_RESULT, out=None):
         """
         Draw pose landmarks on frame.
         ARGS:
             frame: The image to draw on.
-            detection_result: Optional pre-computed result. If None, runs detection (slower).
+            detection_result: Pre-computed result to draw; None or a result without a
+                pose draws nothing. If omitted, the result of the last detect() call is
+                drawn; inference is never re-run here.
+            out: Optional preallocated destination. frame is copied into it and the
+                drawing goes there, leaving frame untouched without allocating.
         """
-        if detection_result is None:
-            # Fallback for separate calls (Legacy/Debug behavior)
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-            detection_result = self.detector.detect(mp_image)
+        if out is not None:
+            np.copyto(out, frame)
+            frame = out
+        
+        if detection_result is _LAST_RESULT:
+            detection_result = self._last_result
         
         if not detection_result or not detection_result.pose_landmarks:
             return frame
@@ -94,30 +140,20 @@ class PoseDetector:
         landmarks = detection_result.pose_landmarks[0]
         height, width, _ = frame.shape
 
-        # Draw connections
-        for connection in self.POSE_CONNECTIONS:
-            start_idx = connection[0]
-            end_idx = connection[1]
-            
-            if start_idx >= len(landmarks) or end_idx >= len(landmarks):
-                continue
-                
-            start_point = landmarks[start_idx]
-            end_point = landmarks[end_idx]
-            
-            # Draw line only if both points are visible enough
-            if start_point.visibility > 0.5 and end_point.visibility > 0.5:
-                cv2.line(frame, 
-                        (int(start_point.x * width), int(start_point.y * height)), 
-                        (int(end_point.x * width), int(end_point.y * height)), 
-                        (255, 255, 255), 2) # White lines
+        # One (x, y, visibility) row per landmark, scaled to pixels in a single pass
+        pts = np.array([(lm.x, lm.y, lm.visibility) for lm in landmarks], dtype=np.float32)
+        pix = (pts[:, :2] * (width, height)).astype(np.int32)
+        visible = pts[:, 2] > 0.5
+
+        # Draw connections whose endpoints are both visible enough, in one call
+        conn = self._connections[(self._connections < len(pts)).all(axis=1)]
+        conn = conn[visible[conn[:, 0]] & visible[conn[:, 1]]]
+        if len(conn):
+            cv2.polylines(frame, list(pix[conn]), False, (255, 255, 255), 2) # White lines
 
         # Draw landmarks
-        for landmark in landmarks:
-             if landmark.visibility > 0.5:
-                cv2.circle(frame, 
-                          (int(landmark.x * width), int(landmark.y * height)), 
-                          5, (0, 0, 255), -1) # Red dots
+        for x, y in pix[visible].tolist():
+            cv2.circle(frame, (x, y), 5, (0, 0, 255), -1) # Red dots
         
         return frame
     